@@ -1,42 +1,21 @@
 from __future__ import annotations
 
 import html
-import urllib.parse
-from pathlib import Path
 
-import numpy as np
 import pandas as pd
 import streamlit as st
 
 from utils import (
-    DATA_DIR,
     WAITERS_CSV,
     TIPS_CSV,
-    QRCODES_DIR,
     load_waiters,
     load_tips,
+    load_rollups,
     append_tip,
     waiter_summary,
+    waiter_totals,
 )
-from sentiment import analyze_sentiment
-from components import ensure_waiter_qr
-
-
-st.set_page_config(page_title="TipTrack", page_icon="💸", layout="wide")
-
-
-def inject_styles():
-    css_path = Path(__file__).parent / "assets" / "styles.css"
-    if css_path.exists():
-        st.markdown(f"<style>{css_path.read_text()}</style>", unsafe_allow_html=True)
-
-
-def read_query_params() -> dict:
-    try:
-        return st.query_params.to_dict()
-    except Exception:
-        # streamlit < 1.32 fallback
-        return st.experimental_get_query_params()
+from ui import inject_styles, read_query_params, rerun
 
 
 def app_header():
@@ -56,16 +35,7 @@ def ensure_data_ready():
 
             generate_main()
             # Safely rerun only when under Streamlit runtime
-            try:
-                # Newer API
-                if callable(getattr(st, "rerun", None)):
-                    st.rerun()  # type: ignore[attr-defined]
-                else:
-                    # Older API
-                    st.experimental_rerun()  # type: ignore[attr-defined]
-            except Exception:
-                # If not in a Streamlit session (e.g., python app/app.py), just continue
-                pass
+            rerun()
 
 
 def tab_customer(waiters_df: pd.DataFrame, tips_df: pd.DataFrame):
@@ -92,6 +62,8 @@ def tab_customer(waiters_df: pd.DataFrame, tips_df: pd.DataFrame):
         feedback = st.text_area("Optional feedback")
 
         if st.button("Submit Tip"):
+            from sentiment import analyze_sentiment
+
             sentiment = analyze_sentiment(feedback)
             append_tip(selected_waiter, amount, rating, feedback, sentiment)
             st.success("Thank you! Your tip and feedback were recorded.")
@@ -99,7 +71,7 @@ def tab_customer(waiters_df: pd.DataFrame, tips_df: pd.DataFrame):
     with col2:
         # Quick stats for selected waiter
         if selected_waiter != "-- Select waiter --":
-            summary = waiter_summary(load_tips(), selected_waiter)
+            summary = waiter_summary(load_tips(), selected_waiter, rollups=load_rollups())
             st.markdown("<div class='metric-box'>", unsafe_allow_html=True)
             st.metric("Total Tips", f"{summary['total_tips']:.2f}")
             st.metric("Average Rating", f"{summary['avg_rating']:.2f}")
@@ -111,7 +83,7 @@ def tab_waiter_dashboard(waiters_df: pd.DataFrame, tips_df: pd.DataFrame):
     st.subheader("Waiter Dashboard")
     waiter_map = {row.waiter_id: row.name for row in waiters_df.itertuples()}
     selected = st.selectbox("Choose waiter", list(waiter_map.keys()))
-    summary = waiter_summary(tips_df, selected)
+    summary = waiter_summary(tips_df, selected, rollups=load_rollups())
     c1, c2, c3 = st.columns(3)
     c1.metric("Total Tips", f"{summary['total_tips']:.2f}")
     c2.metric("Average Rating", f"{summary['avg_rating']:.2f}")
@@ -142,12 +114,8 @@ def tab_owner_dashboard(waiters_df: pd.DataFrame, tips_df: pd.DataFrame):
         st.info("No tips yet.")
         return
 
-    # Aggregate by waiter
-    agg = tips_df.groupby("waiter_id").agg(
-        total_tips=("amount", "sum"),
-        avg_rating=("rating", "mean"),
-        num_tips=("rating", "count"),
-    ).reset_index()
+    # Aggregate by waiter (archived tips come from rollups)
+    agg = waiter_totals(tips_df, load_rollups())
     agg["waiter_name"] = agg["waiter_id"].map({w.waiter_id: w.name for w in waiters_df.itertuples()})
     agg = agg.sort_values("total_tips", ascending=False)
 
@@ -165,6 +133,9 @@ def tab_owner_dashboard(waiters_df: pd.DataFrame, tips_df: pd.DataFrame):
 
 
 def tab_admin_qr(waiters_df: pd.DataFrame):
+    # qrcode/PIL are only needed here; keep them off the startup path
+    from components import ensure_waiter_qr
+
     st.subheader("Admin · Waiter QR Codes")
     base_url = st.text_input("App base URL", value="http://localhost:8501/")
     st.caption("Each QR links to the app with the waiter preselected (via query param).")
@@ -185,6 +156,7 @@ def tab_admin_qr(waiters_df: pd.DataFrame):
 
 
 def main():
+    st.set_page_config(page_title="TipTrack", page_icon="💸", layout="wide")
     inject_styles()
     app_header()
     ensure_data_ready()
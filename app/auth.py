@@ -1,34 +1,244 @@
 from __future__ import annotations
 
-from typing import Tuple
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+from typing import Deque, Dict, Optional, Tuple
 
 import streamlit as st
 
+from ui import rerun
+from utils import DATA_DIR
 
-def get_credentials() -> dict:
-    """Demo credentials. In production load from env/secret file.
+_LOGGER = logging.getLogger(__name__)
+
+# Optional override: {"usernames": {"<user>": {"name": ..., "password_hash": ..., "role": ...}}}
+CREDENTIALS_JSON = DATA_DIR / "credentials.json"
+
+SESSION_TTL_S = 12 * 60 * 60
+MAX_FAILED_LOGINS = 5
+LOCKOUT_WINDOW_S = 5 * 60
+VERIFY_TIMEOUT_S = 10.0
+
+# bcrypt is deliberately slow; cap how many hashes run at once and how many may queue
+_VERIFY_WORKERS = max(1, min(4, os.cpu_count() or 1))
+_VERIFY_POOL = ThreadPoolExecutor(max_workers=_VERIFY_WORKERS, thread_name_prefix="tiptrack-bcrypt")
+_VERIFY_SLOTS = threading.BoundedSemaphore(_VERIFY_WORKERS * 4)
 
-    Users:
+_FAILED_LOGINS: Dict[str, Deque[float]] = {}
+_FAILED_LOGINS_LOCK = threading.Lock()
+# Anyone can submit usernames; sweep stale entries once this many are tracked
+_MAX_TRACKED_USERS = 10_000
+
+_SESSION_KEYS = ["auth_user", "auth_name", "auth_role", "auth_token"]
+
+
+def _demo_credentials() -> dict:
+    """Demo users (bcrypt, cost 12):
       - owner / ownerpass (Owner)
       - admin / adminpass (Admin)
       - waiter1..waiter3 / waiterpass (Waiter)
     """
-    # Minimal embedded credentials (plain text, for demo only)
+    owner = "$2b$12$nFyArvLT58emhwh4PxT7ku/Rzd0iFc9QhXOq/VfchAY4VMfO.eeLK"
+    admin = "$2b$12$5KqMgf3NpGzFnbXKD3vT7uahJVaEopKU4Dld22TXp20lux23N4tJG"
+    waiter = "$2b$12$dy70OQDxI4zqRDzBaOpTTu3ppBJSulhVWmm4nznM6g0Qrja0ByMNy"
     return {
         "usernames": {
-            "owner": {"name": "Owner", "password": "ownerpass", "role": "owner"},
-            "admin": {"name": "Admin", "password": "adminpass", "role": "admin"},
-            "waiter1": {"name": "Waiter 1", "password": "waiterpass", "role": "waiter"},
-            "waiter2": {"name": "Waiter 2", "password": "waiterpass", "role": "waiter"},
-            "waiter3": {"name": "Waiter 3", "password": "waiterpass", "role": "waiter"},
+            "owner": {"name": "Owner", "password_hash": owner, "role": "owner"},
+            "admin": {"name": "Admin", "password_hash": admin, "role": "admin"},
+            "waiter1": {"name": "Waiter 1", "password_hash": waiter, "role": "waiter"},
+            "waiter2": {"name": "Waiter 2", "password_hash": waiter, "role": "waiter"},
+            "waiter3": {"name": "Waiter 3", "password_hash": waiter, "role": "waiter"},
         }
     }
 
 
+@lru_cache(maxsize=1)
+def get_credentials() -> dict:
+    """Credential store of bcrypt hashes, loaded once per process.
+
+    Reads CREDENTIALS_JSON when present, otherwise the embedded demo users.
+    Usernames are lower-cased for case-insensitive lookup. Entries without a
+    bcrypt password_hash or a role (e.g. an old file with plaintext
+    passwords) are skipped; a missing name defaults to the username.
+    """
+    creds = _demo_credentials()
+    if CREDENTIALS_JSON.exists():
+        try:
+            creds = json.loads(CREDENTIALS_JSON.read_text(encoding="utf-8"))
+        except Exception:
+            pass
+    users = {}
+    for username, record in (creds.get("usernames") or {}).items():
+        password_hash = record.get("password_hash") if isinstance(record, dict) else None
+        if not isinstance(password_hash, str) or not password_hash.startswith("$2") or not record.get("role"):
+            _LOGGER.warning(
+                "Skipping user %r in %s: needs a bcrypt password_hash and a role", username, CREDENTIALS_JSON
+            )
+            continue
+        users[username.lower()] = {
+            "name": record.get("name") or username,
+            "password_hash": password_hash,
+            "role": record["role"],
+        }
+    return {"usernames": users}
+
+
+def hash_password(password: str) -> str:
+    """Return a bcrypt hash suitable for CREDENTIALS_JSON."""
+    import bcrypt
+
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(12)).decode("ascii")
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    # Checked for unknown usernames so they cost the same as a wrong password;
+    # a hash of a random secret can never match a real one
+    return hash_password(secrets.token_urlsafe(32))
+
+
+def _checkpw(password: str, password_hash: Optional[str]) -> bool:
+    import bcrypt
+
+    if password_hash is None:
+        bcrypt.checkpw(password.encode("utf-8"), _dummy_hash().encode("ascii"))
+        return False
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("ascii"))
+    except ValueError:
+        # Malformed hash in the store
+        return False
+
+
+def verify_password(password: str, password_hash: Optional[str]) -> Optional[bool]:
+    """Check a password on the bcrypt pool. Returns None if the server is too busy.
+
+    A None hash checks against a dummy hash and always fails (unknown user).
+    """
+    if not _VERIFY_SLOTS.acquire(timeout=VERIFY_TIMEOUT_S):
+        return None
+    try:
+        future = _VERIFY_POOL.submit(_checkpw, password, password_hash)
+    except RuntimeError:
+        _VERIFY_SLOTS.release()
+        return None
+    # The slot is held until the job leaves the pool, not just until we stop waiting
+    future.add_done_callback(lambda _: _VERIFY_SLOTS.release())
+    try:
+        return future.result(timeout=VERIFY_TIMEOUT_S)
+    except FutureTimeout:
+        future.cancel()
+        return None
+
+
+def _reserve_attempt(user_key: str) -> Tuple[float, float]:
+    """Count an attempt as failed before its password is checked.
+
+    Returns (seconds until user_key may try again, attempt stamp); nothing is
+    reserved while locked out. Reserving under the lock keeps parallel
+    submissions from all passing the lockout check while their hashes run.
+    """
+    now = time.monotonic()
+    with _FAILED_LOGINS_LOCK:
+        attempts = _FAILED_LOGINS.get(user_key)
+        if attempts:
+            while attempts and now - attempts[0] > LOCKOUT_WINDOW_S:
+                attempts.popleft()
+            if len(attempts) >= MAX_FAILED_LOGINS:
+                return LOCKOUT_WINDOW_S - (now - attempts[0]), now
+        elif len(_FAILED_LOGINS) >= _MAX_TRACKED_USERS:
+            _prune_failed_logins(now)
+        _FAILED_LOGINS.setdefault(user_key, deque(maxlen=MAX_FAILED_LOGINS)).append(now)
+        return 0.0, now
+
+
+def _settle_attempt(user_key: str, stamp: float, ok: Optional[bool]) -> None:
+    """Clear the user's failures on success; give the attempt back if it was never checked."""
+    with _FAILED_LOGINS_LOCK:
+        attempts = _FAILED_LOGINS.get(user_key)
+        if attempts is None or ok is False:
+            return
+        if ok:
+            del _FAILED_LOGINS[user_key]
+            return
+        if stamp in attempts:
+            attempts.remove(stamp)
+        if not attempts:
+            del _FAILED_LOGINS[user_key]
+
+
+def _prune_failed_logins(now: float) -> None:
+    """Drop users with no attempt inside the lockout window; then the oldest if still full.
+
+    Caller holds _FAILED_LOGINS_LOCK.
+    """
+    stale = [k for k, attempts in _FAILED_LOGINS.items() if not attempts or now - attempts[-1] > LOCKOUT_WINDOW_S]
+    for k in stale:
+        del _FAILED_LOGINS[k]
+    # Dicts keep insertion order, so this evicts the longest-tracked users first
+    while len(_FAILED_LOGINS) >= _MAX_TRACKED_USERS:
+        del _FAILED_LOGINS[next(iter(_FAILED_LOGINS))]
+
+
+@lru_cache(maxsize=1)
+def _secret_key() -> bytes:
+    # Without a configured key, tokens only outlive reruns within this process
+    env_key = os.environ.get("TIPTRACK_SECRET_KEY")
+    return env_key.encode("utf-8") if env_key else secrets.token_bytes(32)
+
+
+def _sign(payload: bytes) -> str:
+    return hmac.new(_secret_key(), payload, hashlib.sha256).hexdigest()
+
+
+def issue_session_token(username: str, name: str, role: str, ttl_s: int = SESSION_TTL_S) -> str:
+    """Signed token carrying the identity, so reruns never need bcrypt again."""
+    claims = {"u": username, "n": name, "r": role, "exp": int(time.time()) + ttl_s}
+    payload = base64.urlsafe_b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload.decode('ascii')}.{_sign(payload)}"
+
+
+def verify_session_token(token: str) -> Optional[dict]:
+    """Return the token claims if the signature is valid and unexpired, else None."""
+    try:
+        payload, signature = token.split(".", 1)
+        if not hmac.compare_digest(_sign(payload.encode("ascii")), signature):
+            return None
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+    except Exception:
+        return None
+    if int(claims.get("exp", 0)) < time.time():
+        return None
+    return claims
+
+
+def _clear_session() -> None:
+    for k in _SESSION_KEYS:
+        if k in st.session_state:
+            del st.session_state[k]
+
+
+def _session_identity() -> Optional[dict]:
+    """Claims of the current session token; drops a forged or expired session."""
+    token = st.session_state.get("auth_token")
+    claims = verify_session_token(token) if token else None
+    if claims is None:
+        _clear_session()
+    return claims
+
+
 def login_widget() -> Tuple[bool, str, str]:
-    creds = get_credentials()["usernames"]
-    # Case-insensitive username lookup
-    creds_ci = {k.lower(): v for k, v in creds.items()}
+    creds_ci = get_credentials()["usernames"]
     st.subheader("Login")
     st.caption("Demo users: owner/ownerpass, admin/adminpass, waiter1..3/waiterpass")
     with st.form("login_form", clear_on_submit=False):
@@ -37,43 +247,40 @@ def login_widget() -> Tuple[bool, str, str]:
         submitted = st.form_submit_button("Sign in")
     if submitted:
         user_key = (user or "").strip().lower()
-        if user_key in creds_ci and creds_ci[user_key]["password"] == pwd:
-            st.session_state["auth_user"] = user_key
-            st.session_state["auth_name"] = creds_ci[user_key]["name"]
-            st.session_state["auth_role"] = creds_ci[user_key]["role"]
-            st.success("Logged in")
-            try:
-                if callable(getattr(st, "rerun", None)):
-                    st.rerun()  # type: ignore[attr-defined]
-                else:
-                    st.experimental_rerun()  # type: ignore[attr-defined]
-            except Exception:
-                pass
+        wait_s, stamp = _reserve_attempt(user_key)
+        if wait_s > 0:
+            st.error(f"Too many failed attempts. Try again in {int(wait_s) + 1} s.")
         else:
-            st.error("Invalid credentials")
-    auth_ok = "auth_user" in st.session_state
+            record = creds_ci.get(user_key)
+            ok = verify_password(pwd or "", record["password_hash"] if record else None)
+            _settle_attempt(user_key, stamp, ok)
+            if ok is None:
+                st.error("Server busy, please try again.")
+            elif ok and record:
+                st.session_state["auth_user"] = user_key
+                st.session_state["auth_name"] = record["name"]
+                st.session_state["auth_role"] = record["role"]
+                st.session_state["auth_token"] = issue_session_token(user_key, record["name"], record["role"])
+                st.success("Logged in")
+                rerun()
+            else:
+                st.error("Invalid credentials")
+    auth_ok = "auth_token" in st.session_state
     return auth_ok, st.session_state.get("auth_name", ""), st.session_state.get("auth_user", "")
 
 
 def logout():
-    for k in ["auth_user", "auth_name", "auth_role"]:
-        if k in st.session_state:
-            del st.session_state[k]
-    try:
-        if callable(getattr(st, "rerun", None)):
-            st.rerun()  # type: ignore[attr-defined]
-        else:
-            st.experimental_rerun()  # type: ignore[attr-defined]
-    except Exception:
-        pass
+    _clear_session()
+    rerun()
 
 
 def require_role(allowed_roles: set[str]) -> Tuple[bool, str, str]:
-    # If already logged in
-    if "auth_user" in st.session_state:
-        username = st.session_state.get("auth_user", "")
-        role = st.session_state.get("auth_role", "")
-        name = st.session_state.get("auth_name", "")
+    # If already logged in (token check only, no re-hashing)
+    claims = _session_identity()
+    if claims is not None:
+        username = claims["u"]
+        role = claims["r"]
+        name = claims["n"]
         # Show status and logout in sidebar
         with st.sidebar:
             st.caption(f"Signed in as {name} ({role})")
@@ -106,6 +313,12 @@ def require_role(allowed_roles: set[str]) -> Tuple[bool, str, str]:
     return True, name, username
 
 
-__all__ = ["require_role", "login_widget"]
-
-
+__all__ = [
+    "require_role",
+    "login_widget",
+    "get_credentials",
+    "hash_password",
+    "verify_password",
+    "issue_session_token",
+    "verify_session_token",
+]
@@ -0,0 +1,102 @@
+"""Cold-start benchmark for the Streamlit pages.
+
+Each page runs in a fresh interpreter (bare mode, no server) so nothing is
+shared between measurements. The script exits non-zero when a page goes over
+its time budget or pulls in a module it should not need.
+
+    python app/bench_imports.py [--repeat 3]
+"""
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+APP_DIR = Path(__file__).resolve().parent
+PAGES_DIR = APP_DIR / "pages"
+
+# Seconds for the first (bare) script run, imports included
+PAGE_BUDGETS: Dict[str, float] = {
+    "app.py": 1.5,
+    "1_Customer.py": 1.5,
+    "2_Waiter_Dashboard.py": 1.5,
+    "3_Owner_Dashboard.py": 1.5,
+    "4_Admin_QR.py": 2.0,
+}
+
+# Top-level modules a page must not import on its cold path
+FORBIDDEN_MODULES: Dict[str, List[str]] = {
+    "app.py": ["qrcode", "PIL", "sentiment", "transformers", "components"],
+    "1_Customer.py": ["qrcode", "PIL", "transformers", "components", "app"],
+    "2_Waiter_Dashboard.py": ["qrcode", "PIL", "sentiment", "transformers", "components", "app"],
+    "3_Owner_Dashboard.py": ["qrcode", "PIL", "sentiment", "transformers", "components", "app"],
+    "4_Admin_QR.py": ["sentiment", "transformers", "app"],
+}
+
+_RUNNER = r"""
+import json, logging, runpy, sys, time
+t0 = time.perf_counter()
+logging.disable(logging.WARNING)
+sys.path.insert(0, {app_dir!r})
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except BaseException:
+    # st.stop() and friends; the run still counts as a cold start
+    pass
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"elapsed": elapsed, "modules": sorted({{m.split(".")[0] for m in sys.modules}})}}))
+"""
+
+
+def _page_path(page: str) -> Path:
+    return APP_DIR / page if page == "app.py" else PAGES_DIR / page
+
+
+def measure_page(page: str) -> Tuple[float, List[str]]:
+    """Run one page in a fresh interpreter; return (seconds, loaded top-level modules)."""
+    code = _RUNNER.format(app_dir=str(APP_DIR), script=str(_page_path(page)))
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=str(APP_DIR.parent),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return float(result["elapsed"]), list(result["modules"])
+
+
+def main() -> int:
+    repeat = 1
+    if "--repeat" in sys.argv:
+        repeat = int(sys.argv[sys.argv.index("--repeat") + 1])
+
+    failures = []
+    for page, budget in PAGE_BUDGETS.items():
+        timings = []
+        modules: List[str] = []
+        for _ in range(repeat):
+            elapsed, modules = measure_page(page)
+            timings.append(elapsed)
+        best = min(timings)
+        leaked = [m for m in FORBIDDEN_MODULES.get(page, []) if m in modules]
+        status = "ok"
+        if best > budget:
+            status = "SLOW"
+            failures.append(f"{page}: {best:.2f}s > {budget:.2f}s budget")
+        if leaked:
+            status = "LEAK"
+            failures.append(f"{page}: imports {', '.join(leaked)}")
+        print(f"{page:<24} {best:6.2f}s  (budget {budget:.2f}s)  {status}")
+
+    if failures:
+        print("\n".join(["", "Cold-start budget exceeded:"] + failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
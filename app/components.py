@@ -5,14 +5,14 @@ from io import BytesIO
 from pathlib import Path
 from typing import Optional
 
-import pandas as pd
-import qrcode
-
 from utils import QRCODES_DIR
 
 
 def generate_qr_png(data: str, filename: Path) -> Path:
     """Generate a QR code PNG file and return its path."""
+    # Imported on first use: qrcode pulls in PIL, which existing PNGs never need
+    import qrcode
+
     img = qrcode.make(data)
     filename.parent.mkdir(parents=True, exist_ok=True)
     img.save(filename)
@@ -7,7 +7,7 @@ from typing import List
 
 from faker import Faker
 
-from utils import DATA_DIR, WAITERS_CSV, TIPS_CSV, QRCODES_DIR
+from utils import DATA_DIR, WAITERS_CSV, TIPS_CSV, SHIFTS_CSV, QRCODES_DIR
 from components import generate_qr_png
 
 
@@ -50,6 +50,19 @@ def write_empty_tips(*, force: bool = False) -> None:
         writer.writeheader()
 
 
+def write_empty_shifts(*, force: bool = False) -> None:
+    SHIFTS_CSV.parent.mkdir(parents=True, exist_ok=True)
+    if SHIFTS_CSV.exists() and not force:
+        print(f"Exists, keeping: {SHIFTS_CSV}")
+        return
+    with SHIFTS_CSV.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f,
+            fieldnames=["shift_id", "waiter_id", "role", "clock_in", "clock_out"],
+        )
+        writer.writeheader()
+
+
 def generate_qrs_for_waiters(app_base_url: str, waiters: List[dict], *, force: bool = False) -> None:
     QRCODES_DIR.mkdir(parents=True, exist_ok=True)
     for w in waiters:
@@ -67,11 +80,13 @@ def main() -> None:
     waiters = generate_waiters(6)
     write_waiters(waiters, force=force)
     write_empty_tips(force=force)
+    write_empty_shifts(force=force)
     # default base URL for local demo
     app_base_url = "http://localhost:8501/"
     generate_qrs_for_waiters(app_base_url, waiters, force=force)
     print(f"Created: {WAITERS_CSV}")
     print(f"Created: {TIPS_CSV}")
+    print(f"Created: {SHIFTS_CSV}")
     print(f"QRs in: {QRCODES_DIR}")
 
 
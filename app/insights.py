@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# metric -> minimum standard deviation, so a perfectly steady history does not
+# turn the first small wobble into an alert
+METRICS: Dict[str, float] = {
+    "tip_amount": 1.0,
+    "rating": 0.25,
+    "negative_share": 0.1,
+}
+
+ALERT_COLUMNS = ["timestamp", "waiter_id", "metric", "direction", "recent", "baseline", "z"]
+
+
+@dataclass
+class _EwState:
+    """Exponentially weighted statistics of one metric for one waiter."""
+
+    n: int = 0
+    fast: float = 0.0
+    slow: float = 0.0
+    var: float = 0.0
+    flagged: bool = False
+
+
+def tip_metrics(tips_df: pd.DataFrame) -> pd.DataFrame:
+    """Per-tip metric columns, in timestamp order (stable for equal timestamps)."""
+    df = tips_df[["timestamp", "waiter_id", "amount", "rating", "sentiment"]].copy()
+    df = df.sort_values("timestamp", kind="stable")
+    df["tip_amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0).astype(float)
+    df["rating"] = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(float)
+    df["negative_share"] = df["sentiment"].astype(str).str.upper().str.startswith("NEG").astype(float)
+    return df[["timestamp", "waiter_id"] + list(METRICS)].reset_index(drop=True)
+
+
+class InsightsEngine:
+    """Rolling per-waiter statistics with drop/spike detection.
+
+    Each metric keeps a fast and a slow exponentially weighted mean plus the
+    slow weighted variance. Once a waiter has `min_obs` tips, a metric is
+    flagged when the fast mean strays more than `threshold` standard errors
+    from the slow baseline, and stays flagged until it comes back within
+    `clear_threshold`. Every update is O(1); `refresh` only replays tips it
+    has not seen.
+    """
+
+    def __init__(
+        self,
+        fast_alpha: float = 0.1,
+        slow_alpha: float = 0.01,
+        threshold: float = 3.5,
+        clear_threshold: float = 2.0,
+        min_obs: int = 100,
+        max_events: int = 500,
+    ) -> None:
+        self.fast_alpha = fast_alpha
+        self.slow_alpha = slow_alpha
+        self.threshold = threshold
+        self.clear_threshold = clear_threshold
+        self.min_obs = min_obs
+        self.max_events = max_events
+        # Std of a fast EWMA of iid noise relative to the noise itself
+        self._fast_scale = math.sqrt(fast_alpha / (2.0 - fast_alpha))
+        self._state: Dict[Tuple[str, str], _EwState] = {}
+        self._events: List[dict] = []
+        # Last processed timestamp and how many tips carried exactly that timestamp
+        self._watermark: Optional[str] = None
+        self._seen_at_watermark = 0
+        self._lock = threading.Lock()
+
+    def _score(self, ew: _EwState, min_std: float) -> float:
+        std = max(math.sqrt(ew.var), min_std) * self._fast_scale
+        return (ew.fast - ew.slow) / std
+
+    def _record_event(self, timestamp: str, waiter_id: str, metric: str, ew: _EwState, z: float) -> None:
+        self._events.append(
+            {
+                "timestamp": timestamp,
+                "waiter_id": waiter_id,
+                "metric": metric,
+                "direction": "spike" if z > 0 else "drop",
+                "recent": ew.fast,
+                "baseline": ew.slow,
+                "z": z,
+            }
+        )
+        if len(self._events) > self.max_events:
+            del self._events[: len(self._events) - self.max_events]
+
+    def update(self, timestamp: str, waiter_id: str, values: Dict[str, float]) -> None:
+        """Fold one tip into the statistics."""
+        with self._lock:
+            self._update(timestamp, waiter_id, values)
+            self._advance_watermark(timestamp)
+
+    def _update(self, timestamp: str, waiter_id: str, values: Dict[str, float]) -> None:
+        for metric, min_std in METRICS.items():
+            x = float(values[metric])
+            ew = self._state.setdefault((waiter_id, metric), _EwState())
+            if ew.n == 0:
+                ew.fast = ew.slow = x
+            else:
+                ew.fast += self.fast_alpha * (x - ew.fast)
+                diff = x - ew.slow
+                incr = self.slow_alpha * diff
+                ew.slow += incr
+                ew.var = (1.0 - self.slow_alpha) * (ew.var + diff * incr)
+            ew.n += 1
+            z = self._score(ew, min_std)
+            if ew.n < self.min_obs or abs(z) < self.clear_threshold:
+                flagged = False
+            elif abs(z) > self.threshold:
+                flagged = True
+            else:
+                flagged = ew.flagged
+            if flagged and not ew.flagged:
+                self._record_event(timestamp, waiter_id, metric, ew, z)
+            ew.flagged = flagged
+
+    def _advance_watermark(self, timestamp: str) -> None:
+        if timestamp == self._watermark:
+            self._seen_at_watermark += 1
+        elif self._watermark is None or timestamp > self._watermark:
+            self._watermark = timestamp
+            self._seen_at_watermark = 1
+
+    def _unseen(self, metrics_df: pd.DataFrame) -> pd.DataFrame:
+        if self._watermark is None:
+            return metrics_df
+        ts = metrics_df["timestamp"].astype(str)
+        at_mark = ts == self._watermark
+        newer = (ts > self._watermark) | (at_mark & (at_mark.cumsum() > self._seen_at_watermark))
+        return metrics_df[newer]
+
+    def refresh(self, tips_df: pd.DataFrame) -> int:
+        """Process tips newer than the last refresh; returns how many were new.
+
+        The first call on an empty engine replays the whole history vectorized.
+        """
+        if tips_df.empty:
+            return 0
+        metrics_df = tip_metrics(tips_df)
+        with self._lock:
+            if not self._state:
+                self._replay(metrics_df)
+                return len(metrics_df)
+            new = self._unseen(metrics_df)
+            cols = ["timestamp", "waiter_id"] + list(METRICS)
+            for row in zip(*(new[c].to_numpy() for c in cols)):
+                self._update(str(row[0]), row[1], dict(zip(METRICS, row[2:])))
+                self._advance_watermark(str(row[0]))
+            return len(new)
+
+    def _replay(self, metrics_df: pd.DataFrame) -> None:
+        events, final = _replay_frame(metrics_df, self)
+        self._events = events.to_dict("records")[-self.max_events:]
+        self._state = final
+        last_ts = str(metrics_df["timestamp"].iat[-1])
+        self._watermark = last_ts
+        self._seen_at_watermark = int((metrics_df["timestamp"].astype(str) == last_ts).sum())
+
+    def active_alerts(self) -> pd.DataFrame:
+        """Metrics currently outside their band, largest deviation first."""
+        rows = []
+        with self._lock:
+            for (waiter_id, metric), ew in self._state.items():
+                if ew.flagged:
+                    z = self._score(ew, METRICS[metric])
+                    rows.append(
+                        {
+                            "waiter_id": waiter_id,
+                            "metric": metric,
+                            "direction": "spike" if z > 0 else "drop",
+                            "recent": ew.fast,
+                            "baseline": ew.slow,
+                            "z": z,
+                        }
+                    )
+        if not rows:
+            return pd.DataFrame(columns=ALERT_COLUMNS[1:])
+        df = pd.DataFrame(rows)
+        return df.reindex(df["z"].abs().sort_values(ascending=False).index)
+
+    def recent_events(self, n: int = 25) -> pd.DataFrame:
+        with self._lock:
+            events = list(self._events[-n:])
+        return pd.DataFrame(events[::-1], columns=ALERT_COLUMNS)
+
+
+def _replay_frame(
+    metrics_df: pd.DataFrame, engine: InsightsEngine
+) -> Tuple[pd.DataFrame, Dict[Tuple[str, str], _EwState]]:
+    """Vectorized equivalent of calling engine.update on every row in order."""
+    grouped = metrics_df.groupby("waiter_id", sort=False)
+    n = grouped.cumcount().to_numpy() + 1
+    events = []
+    final: Dict[Tuple[str, str], _EwState] = {}
+    last_rows = metrics_df.index.isin(grouped.tail(1).index)
+    for metric, min_std in METRICS.items():
+        col = grouped[metric]
+        fast = col.transform(lambda s: s.ewm(alpha=engine.fast_alpha, adjust=False).mean()).to_numpy()
+        slow_ewm = col.transform(lambda s: s.ewm(alpha=engine.slow_alpha, adjust=False).mean()).to_numpy()
+        var = col.transform(lambda s: s.ewm(alpha=engine.slow_alpha, adjust=False).var(bias=True))
+        var = var.fillna(0.0).to_numpy()
+        std = np.maximum(np.sqrt(var), min_std) * engine._fast_scale
+        z = (fast - slow_ewm) / std
+        # Hysteresis as a scan: set above threshold, reset below clear_threshold, else carry
+        warm = n >= engine.min_obs
+        on = warm & (np.abs(z) > engine.threshold)
+        off = ~warm | (np.abs(z) < engine.clear_threshold)
+        marks = pd.Series(np.where(on, 1.0, np.where(off, 0.0, np.nan)), index=metrics_df.index)
+        by_waiter = marks.groupby(metrics_df["waiter_id"])
+        flagged = by_waiter.ffill().fillna(0.0).to_numpy() > 0
+        prev = pd.Series(flagged, index=metrics_df.index).groupby(metrics_df["waiter_id"]).shift(1)
+        raised = flagged & ~prev.fillna(False).astype(bool).to_numpy()
+        hits = metrics_df.loc[raised, ["timestamp", "waiter_id"]].copy()
+        hits["metric"] = metric
+        hits["direction"] = np.where(z[raised] > 0, "spike", "drop")
+        hits["recent"] = fast[raised]
+        hits["baseline"] = slow_ewm[raised]
+        hits["z"] = z[raised]
+        events.append(hits)
+        for i in np.flatnonzero(last_rows):
+            final[(metrics_df["waiter_id"].iat[i], metric)] = _EwState(
+                n=int(n[i]), fast=float(fast[i]), slow=float(slow_ewm[i]), var=float(var[i]), flagged=bool(flagged[i])
+            )
+    out = pd.concat(events).sort_index(kind="stable") if events else pd.DataFrame(columns=ALERT_COLUMNS)
+    return out[ALERT_COLUMNS].reset_index(drop=True), final
+
+
+def backtest(tips_df: pd.DataFrame, **engine_kwargs) -> pd.DataFrame:
+    """Replay the full history and return every alert that would have been raised."""
+    if tips_df.empty:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+    engine = InsightsEngine(**engine_kwargs)
+    events, _ = _replay_frame(tip_metrics(tips_df), engine)
+    return events
+
+
+__all__ = ["METRICS", "InsightsEngine", "tip_metrics", "backtest"]
@@ -0,0 +1,402 @@
+"""Offline load test for the Streamlit pages.
+
+Starts one headless `streamlit run app/app.py` on localhost against a
+generated data set and drives it with N concurrent simulated browser
+sessions over the same websocket protocol the frontend speaks. Every session
+shares that one server process (its script threads, caches, bcrypt pool and
+tips.csv lock), so the report is what one server can sustain: rerun latency
+percentiles, throughput and the server's resident memory. The clients run in
+this process on the same machine and take some CPU from the server.
+
+Exit status is 1 if a page script raised, 2 if only the harness failed to
+drive a page.
+
+    python app/load_test.py --sessions 20 --duration 30
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from sentiment import rule_based_sentiment
+
+
+APP_DIR = Path(__file__).resolve().parent
+APP_SCRIPT = APP_DIR / "app.py"
+
+FEEDBACK = ["", "great service", "friendly and fast", "food was cold", "a bit slow", "excellent", "rude"]
+
+
+def generate_dataset(data_dir: Path, n_waiters: int, n_tips: int, seed: int = 0) -> List[str]:
+    """Write waiters.csv and tips.csv with synthetic history; returns waiter ids."""
+    rng = np.random.default_rng(seed)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    waiter_ids = [f"W{i:03d}" for i in range(1, n_waiters + 1)]
+    pd.DataFrame(
+        {
+            "waiter_id": waiter_ids,
+            "name": [f"Waiter {i}" for i in range(1, n_waiters + 1)],
+            "phone": ["" for _ in waiter_ids],
+        }
+    ).to_csv(data_dir / "waiters.csv", index=False)
+
+    end = pd.Timestamp.now(tz="UTC").floor("s")
+    offsets = np.sort(rng.integers(0, 90 * 24 * 3600, n_tips))[::-1]
+    feedback = rng.choice(FEEDBACK, n_tips)
+    pd.DataFrame(
+        {
+            "timestamp": (end - pd.to_timedelta(offsets, unit="s")).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "waiter_id": rng.choice(waiter_ids, n_tips),
+            "amount": rng.gamma(4, 3, n_tips).round(2),
+            "rating": rng.integers(1, 6, n_tips),
+            "feedback": feedback,
+            "sentiment": [rule_based_sentiment(f) for f in feedback],
+        }
+    ).to_csv(data_dir / "tips.csv", index=False)
+    return waiter_ids
+
+
+class Recorder:
+    """Per-rerun latencies and errors across all sessions, keyed by page."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = {}
+        # Exceptions raised by the page script itself
+        self.errors: Dict[str, int] = {}
+        # Failures driving the page (missing widget, rerun timeout, dropped socket, ...)
+        self.harness_errors: Dict[str, int] = {}
+        self.first_error: Dict[str, str] = {}
+
+    def fail(self, page: str, message: str, harness: bool = False) -> None:
+        counts = self.harness_errors if harness else self.errors
+        counts[page] = counts.get(page, 0) + 1
+        self.first_error.setdefault(page, ("harness: " if harness else "") + message)
+
+
+class Session:
+    """One browser tab: a websocket to the server plus the widget values it sends on each rerun."""
+
+    def __init__(self, ws, page: str, rec: Recorder, timeout: float) -> None:
+        self.ws = ws
+        self.page = page
+        self.rec = rec
+        self.timeout = timeout
+        self.page_hash = ""
+        # label -> widget proto rendered by the last run
+        self.widgets: Dict[str, object] = {}
+        # widget id -> state sent back, like the frontend does on every rerun
+        self.values: Dict[str, object] = {}
+
+    def set(self, label: str, **value) -> None:
+        """Set a widget's value, e.g. set("Waiter", string_value="W001")."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id = self.widgets[label].id
+        self.values[widget_id] = WidgetState(id=widget_id, **value)
+
+    def click(self, label: str) -> None:
+        self.set(label, trigger_value=True)
+
+    def options(self, label: str) -> List[str]:
+        return list(self.widgets[label].options)
+
+    async def run(self, page_name: str = "") -> None:
+        """Request a rerun and wait for it (and any st.rerun it triggers) to finish."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.page_name = page_name
+        msg.rerun_script.page_script_hash = self.page_hash
+        msg.rerun_script.widget_states.widgets.extend(self.values.values())
+        # Button clicks fire once
+        self.values = {k: v for k, v in self.values.items() if not v.HasField("trigger_value")}
+
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        widgets: Dict[str, object] = {}
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            kind = fwd.WhichOneof("type")
+            if kind == "navigation":
+                # The page actually run; sent back so reruns stay on it
+                self.page_hash = fwd.navigation.page_script_hash
+                widgets = {}
+            elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                proto = getattr(element, element.WhichOneof("type"))
+                if element.WhichOneof("type") == "exception":
+                    self.rec.fail(self.page, proto.message)
+                elif getattr(proto, "id", "") and getattr(proto, "label", ""):
+                    widgets[proto.label] = proto
+            elif kind == "script_finished":
+                if fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    break
+        self.rec.latencies.setdefault(self.page, []).append(time.perf_counter() - t0)
+        self.widgets = widgets
+
+
+async def open_session(url: str, page: str, rec: Recorder, timeout: float, page_name: str) -> Session:
+    import websockets
+
+    ws = await asyncio.wait_for(websockets.connect(url, subprotocols=["streamlit"], max_size=None), timeout)
+    session = Session(ws, page, rec, timeout)
+    await session.run(page_name)
+    return session
+
+
+async def customer_session(url: str, rec: Recorder, rng: random.Random, waiter_ids: List[str], timeout: float) -> None:
+    """Open the customer page, pick a waiter and submit a tip (3 reruns)."""
+    s = await open_session(url, "customer", rec, timeout, "Customer")
+    try:
+        s.set("Waiter", string_value=rng.choice(waiter_ids))
+        await s.run()
+        s.set("Tip amount", double_value=round(rng.uniform(1, 40), 2))
+        s.set("Rating", double_array_value={"data": [rng.randint(1, 5)]})
+        s.set("Optional feedback", string_value=rng.choice(FEEDBACK))
+        s.click("Submit Tip")
+        await s.run()
+    finally:
+        await s.ws.close()
+
+
+async def waiter_session(url: str, rec: Recorder, rng: random.Random, waiter_ids: List[str], timeout: float) -> None:
+    """Open the waiter dashboard and switch to another waiter (2 reruns)."""
+    s = await open_session(url, "waiter", rec, timeout, "Waiter_Dashboard")
+    try:
+        s.set("Choose waiter", string_value=rng.choice(s.options("Choose waiter")))
+        await s.run()
+    finally:
+        await s.ws.close()
+
+
+async def owner_session(url: str, rec: Recorder, rng: random.Random, waiter_ids: List[str], timeout: float) -> None:
+    """Sign in to the owner dashboard (one bcrypt check) and rerun it (3 reruns)."""
+    s = await open_session(url, "owner", rec, timeout, "Owner_Dashboard")
+    try:
+        s.set("Username", string_value="owner")
+        s.set("Password", string_value="ownerpass")
+        s.click("Sign in")
+        await s.run()
+        if "Logout" not in s.widgets:
+            raise RuntimeError("owner login failed")
+        await s.run()
+    finally:
+        await s.ws.close()
+
+
+SCENARIOS: Dict[str, Callable[[str, Recorder, random.Random, List[str], float], Awaitable[None]]] = {
+    "customer": customer_session,
+    "waiter": waiter_session,
+    "owner": owner_session,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(data_dir: Path, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    """Launch the app headless on localhost and wait until it answers health checks."""
+    env = dict(os.environ, TIPTRACK_DATA_DIR=str(data_dir))
+    cmd = [
+        sys.executable, "-m", "streamlit", "run", str(APP_SCRIPT),
+        "--server.headless", "true",
+        "--server.address", "127.0.0.1",
+        "--server.port", str(port),
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    log = (data_dir / "server.log").open("wb")
+    proc = subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"streamlit server did not start, see {data_dir / 'server.log'}")
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _rss_mb(pid: int) -> float:
+    """Current resident set size of pid in MB (0 if unavailable)."""
+    status = Path(f"/proc/{pid}/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+        return 0.0
+    try:
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+        return int(out.strip() or 0) / 1024
+    except (OSError, ValueError):  # no ps (Windows)
+        return 0.0
+
+
+async def _sample_rss(pid: int, samples: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        samples.append(await asyncio.to_thread(_rss_mb, pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _session_loop(
+    idx: int,
+    url: str,
+    rec: Recorder,
+    mix: Dict[str, float],
+    waiter_ids: List[str],
+    timeout: float,
+    deadline: float,
+    seed: int,
+) -> None:
+    rng = random.Random(seed + idx)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        try:
+            await SCENARIOS[scenario](url, rec, rng, waiter_ids, timeout)
+        except Exception as exc:
+            rec.fail(scenario, f"{type(exc).__name__}: {exc}", harness=True)
+
+
+async def run_load(
+    url: str,
+    pid: int,
+    sessions: int,
+    duration: float,
+    mix: Dict[str, float],
+    waiter_ids: List[str],
+    timeout: float,
+    seed: int = 0,
+) -> Tuple[Recorder, float, List[float]]:
+    """Drive the server with concurrent sessions; returns (recorder, wall seconds, server RSS samples)."""
+    # Warm the server (imports, caches) the way a first visitor would
+    for scenario in SCENARIOS.values():
+        await scenario(url, Recorder(), random.Random(seed), waiter_ids, timeout)
+
+    rec = Recorder()
+    samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(pid, samples, stop))
+    t0 = time.perf_counter()
+    await asyncio.gather(
+        *(_session_loop(i, url, rec, mix, waiter_ids, timeout, t0 + duration, seed) for i in range(sessions))
+    )
+    wall = time.perf_counter() - t0
+    stop.set()
+    await sampler
+    return rec, wall, samples
+
+
+def report(rec: Recorder, wall: float, rss: List[float], sessions: int) -> None:
+    print(
+        f"{'page':<10} {'reruns':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+        f"{'errors':>7} {'harness':>8}"
+    )
+    total = 0
+    for page, lat in sorted(rec.latencies.items()):
+        ms = np.asarray(lat) * 1000.0
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        total += len(lat)
+        print(
+            f"{page:<10} {len(lat):>7} {p50:>8.1f} {p90:>8.1f} {p99:>8.1f} {ms.max():>8.1f} "
+            f"{rec.errors.get(page, 0):>7} {rec.harness_errors.get(page, 0):>8}"
+        )
+    for page, message in sorted(rec.first_error.items()):
+        print(f"first {page} error: {message}")
+    print(f"\nthroughput: {total / wall:.1f} reruns/s from {sessions} sessions over {wall:.1f}s")
+    if any(rss):
+        print(f"server RSS: {rss[0]:.0f} MB warm, {max(rss):.0f} MB peak, {rss[-1]:.0f} MB at end")
+    else:
+        print("server RSS: unavailable on this platform")
+
+
+def _parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--waiters", type=int, default=20)
+    parser.add_argument("--tips", type=int, default=20000, help="tips of generated history")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("customer=0.7,waiter=0.2,owner=0.1"))
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-rerun timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0, help="server port (default: any free port)")
+    parser.add_argument("--keep-data", action="store_true", help="keep the generated data directory")
+    args = parser.parse_args()
+
+    # Never reach out to model hubs; sentiment falls back to the rule-based scorer
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    data_dir = Path(tempfile.mkdtemp(prefix="tiptrack-load-"))
+    server: Optional[subprocess.Popen] = None
+    try:
+        waiter_ids = generate_dataset(data_dir, args.waiters, args.tips, args.seed)
+        port = args.port or _free_port()
+        server = start_server(data_dir, port)
+        print(
+            f"{args.sessions} sessions for {args.duration:.0f}s, {args.waiters} waiters, "
+            f"{args.tips} tips of history in {data_dir}, server pid {server.pid} on port {port}\n"
+        )
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        rec, wall, rss = asyncio.run(
+            run_load(url, server.pid, args.sessions, args.duration, args.mix, waiter_ids, args.timeout, args.seed)
+        )
+        report(rec, wall, rss, args.sessions)
+        if rec.errors:
+            return 1
+        return 2 if rec.harness_errors else 0
+    finally:
+        if server is not None:
+            stop_server(server)
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
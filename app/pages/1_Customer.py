@@ -1,11 +1,10 @@
 from __future__ import annotations
 
 import streamlit as st
-import pandas as pd
 
 from utils import load_waiters, append_tip
 from sentiment import analyze_sentiment
-from app import read_query_params  # reuse helper
+from ui import read_query_params
 
 
 st.set_page_config(page_title="TipTrack · Customer", page_icon="💸", layout="wide")
@@ -3,8 +3,7 @@ from __future__ import annotations
 import streamlit as st
 import pandas as pd
 
-from utils import load_waiters, load_tips
-from app import waiter_summary
+from utils import load_waiters, load_tips, load_rollups, waiter_summary
 
 
 st.set_page_config(page_title="TipTrack · Waiter", page_icon="🍽️", layout="wide")
@@ -15,7 +14,7 @@ tips_df = load_tips()
 
 waiter_map = {row.waiter_id: row.name for row in waiters_df.itertuples()}
 selected = st.selectbox("Choose waiter", list(waiter_map.keys()))
-summary = waiter_summary(tips_df, selected)
+summary = waiter_summary(tips_df, selected, rollups=load_rollups())
 col1, col2, col3 = st.columns(3)
 col1.metric("Total Tips", f"{summary['total_tips']:.2f}")
 col2.metric("Average Rating", f"{summary['avg_rating']:.2f}")
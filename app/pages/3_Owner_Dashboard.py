@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+from datetime import date, timedelta
+
 import streamlit as st
 import pandas as pd
 
-from utils import load_waiters, load_tips
+from utils import load_waiters, load_tips, load_shifts, load_rollups, waiter_totals
 from auth import require_role
+from payouts import POOL_METHODS, PoolingRule, compute_payouts, payout_totals
+from insights import InsightsEngine, backtest
+from ui import warn_unreadable
+
+
+@st.cache_resource
+def insights_engine() -> InsightsEngine:
+    # One engine per server process; each load only folds in tips it has not seen
+    return InsightsEngine()
 
 
 st.set_page_config(page_title="TipTrack · Owner", page_icon="📊", layout="wide")
@@ -15,15 +26,34 @@ require_role({"owner"})
 
 waiters_df = load_waiters()
 tips_df = load_tips()
+rollups_df = load_rollups()
 
-if tips_df.empty:
+if tips_df.empty and rollups_df.empty:
     st.info("No tips yet.")
 else:
-    agg = tips_df.groupby("waiter_id").agg(
-        total_tips=("amount", "sum"),
-        avg_rating=("rating", "mean"),
-        num_tips=("rating", "count"),
-    ).reset_index()
+    st.markdown("### AI Insights")
+    engine = insights_engine()
+    engine.refresh(tips_df)
+    alerts = engine.active_alerts()
+    names = {w.waiter_id: w.name for w in waiters_df.itertuples()}
+    if alerts.empty:
+        st.success("No unusual changes in tips, ratings or feedback sentiment.")
+    for a in alerts.itertuples():
+        label = a.metric.replace("_", " ")
+        st.warning(
+            f"{names.get(a.waiter_id, a.waiter_id)}: {label} {a.direction} "
+            f"(recent {a.recent:.2f} vs baseline {a.baseline:.2f})"
+        )
+    with st.expander("Alert history"):
+        st.dataframe(engine.recent_events(), use_container_width=True, hide_index=True)
+        if st.button("Backtest full history"):
+            # Reads the archive on demand; the live engine only sees hot tips
+            full_history = load_tips(include_archive=True)
+            warn_unreadable(full_history)
+            st.dataframe(backtest(full_history), use_container_width=True, hide_index=True)
+
+    # Hot tips plus archived rollups, so totals survive compaction
+    agg = waiter_totals(tips_df, rollups_df)
     agg["waiter_name"] = agg["waiter_id"].map({w.waiter_id: w.name for w in waiters_df.itertuples()})
     agg = agg.sort_values("total_tips", ascending=False)
 
@@ -39,4 +69,27 @@ else:
     feed["waiter_name"] = feed["waiter_id"].map({w.waiter_id: w.name for w in waiters_df.itertuples()})
     st.dataframe(feed, use_container_width=True, hide_index=True)
 
-
+    st.markdown("### Shift Payouts")
+    shifts_df = load_shifts()
+    if shifts_df.empty:
+        st.info("No shift roster yet. Add shifts to data/shifts.csv to compute pooled payouts.")
+    else:
+        c1, c2, c3 = st.columns(3)
+        method = c1.selectbox("Pooling method", list(POOL_METHODS))
+        house_share = c2.slider("House share", min_value=0.0, max_value=0.5, value=0.0, step=0.05)
+        period = c3.date_input("Period", value=(date.today() - timedelta(days=14), date.today()))
+        if isinstance(period, (tuple, list)) and len(period) == 2:
+            start, end = period[0], period[1] + timedelta(days=1)
+            period_tips = load_tips(since=start, include_archive=True)
+            warn_unreadable(period_tips)
+            payouts = compute_payouts(
+                period_tips, shifts_df, PoolingRule(method=method, house_share=house_share), start=start, end=end
+            )
+            if payouts.empty:
+                st.info("No shifts in this period.")
+            else:
+                totals = payout_totals(payouts)
+                totals["waiter_name"] = totals["waiter_id"].map({w.waiter_id: w.name for w in waiters_df.itertuples()})
+                st.dataframe(totals, use_container_width=True, hide_index=True)
+                with st.expander("Per-shift breakdown"):
+                    st.dataframe(payouts, use_container_width=True, hide_index=True)
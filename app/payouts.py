@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+
+POOL_METHODS = ("hours", "role", "role_hours", "individual")
+
+PAYOUT_COLUMNS = [
+    "shift_id",
+    "shift_start",
+    "shift_end",
+    "waiter_id",
+    "role",
+    "hours",
+    "weight",
+    "pool",
+    "payout",
+]
+
+
+@dataclass(frozen=True)
+class PoolingRule:
+    """How a shift's tips are split among the waiters on its roster.
+
+    method:
+      - hours: pro rata by hours worked
+      - role: by role weight, regardless of hours
+      - role_hours: by role weight x hours worked
+      - individual: no pooling, each waiter keeps their own tips
+    role_weights: (role, weight) pairs; roles not listed weigh 1.0
+    house_share: fraction of each pool kept by the house before splitting
+    """
+
+    method: str = "hours"
+    role_weights: Tuple[Tuple[str, float], ...] = ()
+    house_share: float = 0.0
+
+    def __post_init__(self) -> None:
+        if self.method not in POOL_METHODS:
+            raise ValueError(f"Unknown pooling method: {self.method!r}")
+        if not 0.0 <= self.house_share < 1.0:
+            raise ValueError("house_share must be in [0, 1)")
+
+
+# (shift_id, rule, roster fingerprint, tips fingerprint) -> payout rows of a
+# closed shift, least recently used first
+_CLOSED_SHIFT_CACHE: "OrderedDict[Tuple[str, PoolingRule, int, int], pd.DataFrame]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_MAX_CACHED_SHIFTS = 5000
+
+
+def _utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _empty_payouts_df() -> pd.DataFrame:
+    return pd.DataFrame(columns=PAYOUT_COLUMNS)
+
+
+def _prepare_roster(roster_df: pd.DataFrame) -> pd.DataFrame:
+    """One row per (shift_id, waiter_id), with that waiter's hours summed.
+
+    A split shift or a break gives a waiter several clock-in/out rows; they
+    are merged so the waiter is weighted (and paid) once per shift. The
+    fingerprint column hashes the shift's raw roster rows.
+    """
+    roster = roster_df.copy()
+    for col in ["clock_in", "clock_out"]:
+        roster[col] = pd.to_datetime(roster[col], utc=True, errors="coerce").astype("datetime64[ns, UTC]")
+    roster = roster.dropna(subset=["clock_in", "clock_out"])
+    roster["role"] = roster["role"].fillna("").astype(str)
+    roster["hours"] = (roster["clock_out"] - roster["clock_in"]).dt.total_seconds().clip(lower=0) / 3600.0
+    fingerprints = _roster_fingerprints(roster)
+    roster = roster.sort_values("clock_in", kind="stable").groupby(["shift_id", "waiter_id"], as_index=False).agg(
+        role=("role", "first"),
+        clock_in=("clock_in", "min"),
+        clock_out=("clock_out", "max"),
+        hours=("hours", "sum"),
+    )
+    grouped = roster.groupby("shift_id")
+    roster["shift_start"] = grouped["clock_in"].transform("min")
+    roster["shift_end"] = grouped["clock_out"].transform("max")
+    roster["fingerprint"] = roster["shift_id"].map(fingerprints)
+    return roster
+
+
+def _roster_fingerprints(roster: pd.DataFrame) -> pd.Series:
+    """One hash per shift_id; changes whenever any of that shift's roster rows change."""
+    cols = ["shift_id", "waiter_id", "role", "clock_in", "clock_out"]
+    row_hash = pd.util.hash_pandas_object(roster[cols], index=False).astype("uint64")
+    return row_hash.groupby(roster["shift_id"]).sum()
+
+
+def _tip_fingerprints(tagged: pd.DataFrame) -> pd.Series:
+    """One hash per shift_id of the tips assigned to it."""
+    row_hash = pd.util.hash_pandas_object(tagged[["ts", "waiter_id", "amount"]], index=False).astype("uint64")
+    return row_hash.groupby(tagged["shift_id"]).sum()
+
+
+def _assign_tips_to_shifts(tips_df: pd.DataFrame, shifts: pd.DataFrame) -> pd.DataFrame:
+    """Tag each tip with the shift whose [start, end) window contains its timestamp."""
+    tips = tips_df[["timestamp", "waiter_id", "amount"]].copy()
+    tips["ts"] = pd.to_datetime(tips["timestamp"], utc=True, errors="coerce").astype("datetime64[ns, UTC]")
+    tips = tips.dropna(subset=["ts"]).sort_values("ts")
+    windows = shifts.sort_values("shift_start")
+    tagged = pd.merge_asof(tips, windows, left_on="ts", right_on="shift_start", direction="backward")
+    return tagged[tagged["ts"] < tagged["shift_end"]]
+
+
+def _allocate(tagged: pd.DataFrame, roster: pd.DataFrame, rule: PoolingRule) -> pd.DataFrame:
+    """Vectorized split of every shift in roster at once, given tips tagged with their shift."""
+    out = roster[["shift_id", "shift_start", "shift_end", "waiter_id", "role", "hours"]].copy()
+    keep = 1.0 - rule.house_share
+
+    if rule.method == "individual":
+        own = tagged.groupby(["shift_id", "waiter_id"])["amount"].sum().rename("own")
+        out = out.join(own, on=["shift_id", "waiter_id"])
+        out["own"] = out["own"].fillna(0.0)
+        out["weight"] = 1.0
+        out["pool"] = out.groupby("shift_id")["own"].transform("sum") * keep
+        out["payout"] = out["own"] * keep
+        return out[PAYOUT_COLUMNS]
+
+    role_weight = out["role"].map(dict(rule.role_weights)).fillna(1.0)
+    if rule.method == "hours":
+        out["weight"] = out["hours"]
+    elif rule.method == "role":
+        out["weight"] = role_weight
+    else:
+        out["weight"] = role_weight * out["hours"]
+
+    pools = tagged.groupby("shift_id")["amount"].sum() * keep
+    out["pool"] = out["shift_id"].map(pools).fillna(0.0)
+    total_weight = out.groupby("shift_id")["weight"].transform("sum")
+    share = (out["weight"] / total_weight.where(total_weight > 0)).fillna(0.0)
+    out["payout"] = share * out["pool"]
+    return out[PAYOUT_COLUMNS]
+
+
+def compute_payouts(
+    tips_df: pd.DataFrame,
+    roster_df: pd.DataFrame,
+    rule: PoolingRule = PoolingRule(),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    now: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """Payout per waiter per shift for shifts starting in [start, end).
+
+    roster_df needs shift_id, waiter_id, role, clock_in, clock_out; a waiter
+    may have several rows per shift. A shift spans its earliest clock-in to
+    its latest clock-out; shifts are assumed not to overlap and tips outside
+    every shift are left unallocated. Shifts that ended before `now` are
+    closed: their rows are cached and only recomputed when their roster rows
+    or their tips change.
+    """
+    if tips_df.empty or roster_df.empty:
+        return _empty_payouts_df()
+    roster = _prepare_roster(roster_df)
+    if start is not None:
+        roster = roster[roster["shift_start"] >= _utc(start)]
+    if end is not None:
+        roster = roster[roster["shift_start"] < _utc(end)]
+    if roster.empty:
+        return _empty_payouts_df()
+
+    now_ts = _utc(now or datetime.now(timezone.utc))
+    shifts = roster[["shift_id", "shift_start", "shift_end"]].drop_duplicates("shift_id")
+    tagged = _assign_tips_to_shifts(tips_df, shifts)
+    roster_fps = roster.groupby("shift_id")["fingerprint"].first()
+    tip_fps = _tip_fingerprints(tagged)
+    closed_ids = set(roster.loc[roster["shift_end"] <= now_ts, "shift_id"])
+    keys = {
+        shift_id: (shift_id, rule, int(roster_fps[shift_id]), int(tip_fps.get(shift_id, 0)))
+        for shift_id in closed_ids
+    }
+
+    cached = []
+    with _CACHE_LOCK:
+        for key in keys.values():
+            hit = _CLOSED_SHIFT_CACHE.get(key)
+            if hit is not None:
+                _CLOSED_SHIFT_CACHE.move_to_end(key)
+                cached.append(hit)
+    cached_ids = {df["shift_id"].iat[0] for df in cached if not df.empty}
+
+    todo = roster[~roster["shift_id"].isin(cached_ids)]
+    if todo.empty:
+        fresh = _empty_payouts_df()
+    else:
+        fresh = _allocate(tagged[tagged["shift_id"].isin(todo["shift_id"])], todo, rule)
+
+    with _CACHE_LOCK:
+        for shift_id, rows in fresh[fresh["shift_id"].isin(closed_ids)].groupby("shift_id"):
+            _CLOSED_SHIFT_CACHE[keys[shift_id]] = rows
+        while len(_CLOSED_SHIFT_CACHE) > _MAX_CACHED_SHIFTS:
+            _CLOSED_SHIFT_CACHE.popitem(last=False)
+
+    frames = [df for df in cached + [fresh] if not df.empty]
+    if not frames:
+        return _empty_payouts_df()
+    result = pd.concat(frames, ignore_index=True)
+    return result.sort_values(["shift_start", "shift_id", "waiter_id"]).reset_index(drop=True)
+
+
+def payout_totals(payouts_df: pd.DataFrame) -> pd.DataFrame:
+    """Collapse per-shift payouts into one row per waiter for the period."""
+    if payouts_df.empty:
+        return pd.DataFrame(columns=["waiter_id", "shifts", "hours", "payout"])
+    totals = payouts_df.groupby("waiter_id").agg(
+        shifts=("shift_id", "nunique"),
+        hours=("hours", "sum"),
+        payout=("payout", "sum"),
+    ).reset_index()
+    totals["payout"] = totals["payout"].round(2)
+    return totals.sort_values("payout", ascending=False)
+
+
+def clear_payout_cache() -> None:
+    with _CACHE_LOCK:
+        _CLOSED_SHIFT_CACHE.clear()
+
+
+__all__ = [
+    "POOL_METHODS",
+    "PoolingRule",
+    "compute_payouts",
+    "payout_totals",
+    "clear_payout_cache",
+]
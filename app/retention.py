@@ -0,0 +1,218 @@
+"""Retention job: move old tips out of tips.csv into compressed monthly archives.
+
+Tips older than the retention window (whole UTC days) are appended to
+data/archive/tips-YYYY-MM.csv.gz and summarized into data/archive/rollups.csv,
+so tips.csv only holds the recent working set. Archived tips stay readable via
+utils.load_tips(include_archive=True).
+
+tips.csv is swapped before the rollups are published, so dashboards never
+count a tip twice (for a moment they may miss the newly archived days). The
+manifest lets a run that died part way be finished by the next one.
+
+    python app/retention.py [--days 90]
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    ARCHIVE_DIR,
+    ROLLUPS_CSV,
+    ROLLUP_COLUMNS,
+    TIPS_CSV,
+    TIP_COLUMNS,
+    archive_partition_path,
+    file_lock,
+    tips_lock,
+)
+
+
+DEFAULT_RETENTION_DAYS = int(os.environ.get("TIPTRACK_RETENTION_DAYS", "90"))
+
+# {"partitions": {month: {"cutoff": ..., "rows": ...}}, "pending_rollups": [month, ...]}
+# Partition entries describe the last write to that partition and are recorded
+# before it is replaced; pending_rollups lists months whose rows have left
+# tips.csv but whose rollups are not yet published.
+MANIFEST_JSON = ARCHIVE_DIR / "manifest.json"
+# Held for a whole run so overlapping jobs (e.g. from cron) take turns
+RETENTION_LOCK = ARCHIVE_DIR / "retention.lock"
+
+
+def _atomic_write_csv(df: pd.DataFrame, path: Path, **kwargs) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_csv(tmp, index=False, **kwargs)
+    os.replace(tmp, path)
+
+
+def rollups_for(tips: pd.DataFrame) -> pd.DataFrame:
+    """Per-day, per-waiter aggregates of raw (string-typed) tip rows."""
+    ts = pd.to_datetime(tips["timestamp"], utc=True, errors="coerce")
+    df = pd.DataFrame(
+        {
+            # Format per group, not per row: strftime over every tip is slow
+            "date": ts.dt.tz_localize(None).dt.normalize(),
+            "waiter_id": tips["waiter_id"],
+            "total_tips": pd.to_numeric(tips["amount"], errors="coerce").fillna(0.0),
+            "num_tips": 1,
+            "rating_sum": pd.to_numeric(tips["rating"], errors="coerce").fillna(0).astype(int),
+            "negative_tips": tips["sentiment"].astype(str).str.upper().str.startswith("NEG").astype(int),
+        }
+    )
+    out = df.groupby(["date", "waiter_id"], as_index=False)[ROLLUP_COLUMNS[2:]].sum()
+    out["date"] = out["date"].dt.strftime("%Y-%m-%d")
+    return out
+
+
+def _read_manifest() -> dict:
+    manifest = {"partitions": {}, "pending_rollups": []}
+    if MANIFEST_JSON.exists():
+        manifest.update(json.loads(MANIFEST_JSON.read_text(encoding="utf-8")))
+    return manifest
+
+
+def _write_manifest(manifest: dict) -> None:
+    tmp = MANIFEST_JSON.with_name(MANIFEST_JSON.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, MANIFEST_JSON)
+
+
+def _read_partition(month: str) -> Optional[pd.DataFrame]:
+    path = archive_partition_path(month)
+    return pd.read_csv(path, dtype=str, keep_default_na=False) if path.exists() else None
+
+
+def _already_archived(rows: pd.DataFrame, existing: pd.DataFrame) -> np.ndarray:
+    """Mask of rows that have an identical row in existing, matched one for one."""
+    left = rows[TIP_COLUMNS].assign(_n=rows.groupby(TIP_COLUMNS, sort=False).cumcount())
+    right = existing[TIP_COLUMNS].assign(_n=existing.groupby(TIP_COLUMNS, sort=False).cumcount())
+    hits = left.merge(right, on=TIP_COLUMNS + ["_n"], how="left", indicator=True)
+    return (hits["_merge"] == "both").to_numpy()
+
+
+def _archive_month(month: str, rows: pd.DataFrame, cutoff: pd.Timestamp, manifest: dict) -> pd.DataFrame:
+    """Append rows to a month's partition; returns the partition's full contents.
+
+    If the manifest shows the previous write to this partition landed, rows
+    dated before its cutoff may be that run's rows, still in tips.csv because
+    it died before the swap. Those are skipped only if the partition already
+    holds them; anything else (e.g. a back-dated import) is archived.
+    """
+    existing = _read_partition(month)
+    if existing is None:
+        existing = rows.iloc[:0]
+    last = manifest["partitions"].get(month)
+    if last is not None and len(existing) == last["rows"]:
+        ts = pd.to_datetime(rows["timestamp"], utc=True, errors="coerce")
+        before = (ts < pd.Timestamp(last["cutoff"])).to_numpy()
+        if before.any():
+            done = np.zeros(len(rows), dtype=bool)
+            done[before] = _already_archived(rows[before], existing)
+            rows = rows[~done]
+    if rows.empty:
+        return existing
+    out = pd.concat([existing, rows], ignore_index=True).sort_values("timestamp", kind="stable")
+    manifest["partitions"][month] = {"cutoff": cutoff.isoformat(), "rows": len(out)}
+    _write_manifest(manifest)
+    _atomic_write_csv(out[TIP_COLUMNS], archive_partition_path(month), compression="gzip")
+    return out
+
+
+def _publish_rollups(months: List[str], partitions: Dict[str, pd.DataFrame]) -> None:
+    """Rebuild the rollups of months from their full partitions (read if not given)."""
+    frames = []
+    if ROLLUPS_CSV.exists():
+        existing = pd.read_csv(ROLLUPS_CSV, dtype={"date": str, "waiter_id": str})
+        frames.append(existing[~existing["date"].str[:7].isin(months)])
+    for month in months:
+        rows = partitions[month] if month in partitions else _read_partition(month)
+        if rows is not None:
+            frames.append(rollups_for(rows))
+    if not frames:
+        return
+    rollups = pd.concat(frames, ignore_index=True).sort_values(["date", "waiter_id"])
+    _atomic_write_csv(rollups[ROLLUP_COLUMNS], ROLLUPS_CSV)
+
+
+def compact_tips(max_age_days: int = DEFAULT_RETENTION_DAYS, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Archive tips older than max_age_days; returns counts of archived and kept rows."""
+    with file_lock(RETENTION_LOCK):
+        manifest = _read_manifest()
+        partitions: Dict[str, pd.DataFrame] = {}
+        stats = _compact(max_age_days, now, manifest, partitions)
+        # Also finishes a previous run that died between the swap and publishing
+        if manifest["pending_rollups"]:
+            _publish_rollups(manifest["pending_rollups"], partitions)
+            manifest["pending_rollups"] = []
+            _write_manifest(manifest)
+    return stats
+
+
+def _compact(
+    max_age_days: int,
+    now: Optional[datetime],
+    manifest: dict,
+    partitions: Dict[str, pd.DataFrame],
+) -> Dict[str, int]:
+    if not TIPS_CSV.exists():
+        return {"archived": 0, "kept": 0}
+    with tips_lock():
+        # A snapshot that ends on a row boundary; later appends become the tail
+        data = TIPS_CSV.read_bytes()
+    raw = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    for col in TIP_COLUMNS:
+        if col not in raw.columns:
+            raw[col] = ""
+    raw = raw[TIP_COLUMNS]
+
+    now_ts = pd.Timestamp(now or datetime.now(timezone.utc))
+    now_ts = now_ts.tz_localize("UTC") if now_ts.tzinfo is None else now_ts.tz_convert("UTC")
+    cutoff = (now_ts - pd.Timedelta(days=max_age_days)).normalize()
+    ts = pd.to_datetime(raw["timestamp"], utc=True, errors="coerce")
+    # Unparseable timestamps compare False and stay hot
+    old_mask = (ts < cutoff).to_numpy()
+    if not old_mask.any():
+        return {"archived": 0, "kept": len(raw)}
+
+    old = raw[old_mask]
+    months = ts[old_mask].dt.tz_localize(None).dt.to_period("M")
+    for period, rows in old.groupby(months):
+        month = str(period)
+        partitions[month] = _archive_month(month, rows, cutoff, manifest)
+    manifest["pending_rollups"] = sorted(set(manifest["pending_rollups"]) | set(partitions))
+    _write_manifest(manifest)
+
+    # Rewrite the hot file, carrying over anything appended while we worked;
+    # the lock keeps append_tip out between reading the tail and the swap
+    keep = raw[~old_mask]
+    tmp = TIPS_CSV.with_name(TIPS_CSV.name + ".tmp")
+    keep.to_csv(tmp, index=False)
+    with tips_lock():
+        tail = TIPS_CSV.read_bytes()[len(data):]
+        if tail:
+            with tmp.open("ab") as f:
+                f.write(tail)
+        os.replace(tmp, TIPS_CSV)
+    return {"archived": int(old_mask.sum()), "kept": len(keep)}
+
+
+def main() -> None:
+    days = DEFAULT_RETENTION_DAYS
+    if "--days" in sys.argv:
+        days = int(sys.argv[sys.argv.index("--days") + 1])
+    print(f"Archiving tips older than {days} days...")
+    stats = compact_tips(days)
+    print(f"Archived: {stats['archived']} tips into {ARCHIVE_DIR}")
+    print(f"Kept hot: {stats['kept']} tips in {TIPS_CSV}")
+
+
+if __name__ == "__main__":
+    main()
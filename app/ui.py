@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+
+STYLES_CSS = Path(__file__).resolve().parent / "assets" / "styles.css"
+
+
+def inject_styles() -> None:
+    if STYLES_CSS.exists():
+        st.markdown(f"<style>{STYLES_CSS.read_text()}</style>", unsafe_allow_html=True)
+
+
+def read_query_params() -> dict:
+    try:
+        return st.query_params.to_dict()
+    except Exception:
+        # streamlit < 1.32 fallback
+        return st.experimental_get_query_params()
+
+
+def rerun() -> None:
+    """Rerun the script, ignoring the call outside a Streamlit session."""
+    try:
+        if callable(getattr(st, "rerun", None)):
+            st.rerun()  # type: ignore[attr-defined]
+        else:
+            st.experimental_rerun()  # type: ignore[attr-defined]
+    except Exception:
+        # If not in a Streamlit session (e.g., python app/app.py), just continue
+        pass
+
+
+def warn_unreadable(tips_df: pd.DataFrame) -> None:
+    """Flag tips files load_tips had to skip, so partial totals are not taken at face value."""
+    unreadable = tips_df.attrs.get("unreadable")
+    if unreadable:
+        names = ", ".join(Path(p).name for p in unreadable)
+        st.warning(f"Could not read {names}; figures for those months are incomplete.")
+
+
+__all__ = ["inject_styles", "read_query_params", "rerun", "warn_unreadable"]
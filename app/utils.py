@@ -1,23 +1,43 @@
 from __future__ import annotations
 
 import csv
+import logging
+import os
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from functools import lru_cache
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
-# Paths
+_LOGGER = logging.getLogger(__name__)
+
+
+# Paths (directories are created by the writers that need them, not at import)
 APP_DIR = Path(__file__).resolve().parent
-DATA_DIR = APP_DIR.parent / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+# TIPTRACK_DATA_DIR points the app at another data set (e.g. load tests)
+DATA_DIR = Path(os.environ.get("TIPTRACK_DATA_DIR") or APP_DIR.parent / "data")
 
 WAITERS_CSV = DATA_DIR / "waiters.csv"
 TIPS_CSV = DATA_DIR / "tips.csv"
+# Held by every writer of tips.csv (append_tip, the retention rewrite)
+TIPS_LOCK = DATA_DIR / "tips.csv.lock"
+SHIFTS_CSV = DATA_DIR / "shifts.csv"
 QRCODES_DIR = DATA_DIR / "qrcodes"
-QRCODES_DIR.mkdir(parents=True, exist_ok=True)
+
+# Tips older than the retention window live in monthly gzip partitions
+# (tips-YYYY-MM.csv.gz) next to per-day, per-waiter rollups
+ARCHIVE_DIR = DATA_DIR / "archive"
+ROLLUPS_CSV = ARCHIVE_DIR / "rollups.csv"
+ROLLUP_COLUMNS = ["date", "waiter_id", "total_tips", "num_tips", "rating_sum", "negative_tips"]
+TIP_COLUMNS = ["timestamp", "waiter_id", "amount", "rating", "feedback", "sentiment"]
 
 
 def _empty_waiters_df() -> pd.DataFrame:
@@ -37,6 +57,10 @@ def _empty_tips_df() -> pd.DataFrame:
     )
 
 
+def _empty_shifts_df() -> pd.DataFrame:
+    return pd.DataFrame(columns=["shift_id", "waiter_id", "role", "clock_in", "clock_out"])
+
+
 def load_waiters() -> pd.DataFrame:
     """Load waiters from CSV. Returns empty DataFrame if missing."""
     if not WAITERS_CSV.exists():
@@ -53,28 +77,162 @@ def load_waiters() -> pd.DataFrame:
         return _empty_waiters_df()
 
 
-def load_tips() -> pd.DataFrame:
-    """Load tips from CSV. Returns empty DataFrame if missing."""
-    if not TIPS_CSV.exists():
-        return _empty_tips_df()
+def _read_tips_csv(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path)
+    # Coerce dtypes
+    if "amount" in df.columns:
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
+    if "rating" in df.columns:
+        df["rating"] = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(int)
+    for col in ["timestamp", "waiter_id", "feedback", "sentiment"]:
+        if col not in df.columns:
+            df[col] = ""
+    return df[TIP_COLUMNS]
+
+
+def archive_partition_path(month: str) -> Path:
+    """Archive file for a month given as YYYY-MM."""
+    return ARCHIVE_DIR / f"tips-{month}.csv.gz"
+
+
+def archive_partitions(since: Optional[object] = None) -> List[Path]:
+    """Archive files in month order, skipping months entirely before `since`."""
+    if not ARCHIVE_DIR.exists():
+        return []
+    paths = sorted(ARCHIVE_DIR.glob("tips-????-??.csv.gz"))
+    if since is None:
+        return paths
+    first_month = _to_utc(since).strftime("%Y-%m")
+    return [p for p in paths if p.name[len("tips-"):len("tips-YYYY-MM")] >= first_month]
+
+
+def _to_utc(value: object) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def load_tips(since: Optional[object] = None, include_archive: bool = False) -> pd.DataFrame:
+    """Load tips from CSV. Returns empty DataFrame if missing.
+
+    By default only the hot file is read. With include_archive=True the
+    archived partitions are read too (only months from `since` onwards), so
+    callers can query any period through the same API. `since` drops tips
+    before that time.
+
+    Files that fail to read are logged and skipped; their paths are listed in
+    the result's attrs["unreadable"] so callers can flag incomplete totals.
+    """
+    paths = archive_partitions(since) if include_archive else []
+    if TIPS_CSV.exists():
+        paths.append(TIPS_CSV)
+    frames = []
+    unreadable = []
+    for path in paths:
+        try:
+            frames.append(_read_tips_csv(path))
+        except Exception:
+            _LOGGER.warning("Skipping unreadable tips file %s", path, exc_info=True)
+            unreadable.append(str(path))
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        df = _empty_tips_df()
+    else:
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if since is not None and not df.empty:
+        ts = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
+        df = df[ts >= _to_utc(since)].reset_index(drop=True)
+    df.attrs["unreadable"] = unreadable
+    return df
+
+
+@lru_cache(maxsize=4)
+def _read_rollups(mtime_ns: int) -> pd.DataFrame:
+    # Keyed by mtime so a compaction run invalidates the cached copy
+    df = pd.read_csv(ROLLUPS_CSV, dtype={"date": str, "waiter_id": str})
+    for col in ROLLUP_COLUMNS:
+        if col not in df.columns:
+            df[col] = 0
+    return df[ROLLUP_COLUMNS]
+
+
+def load_rollups() -> pd.DataFrame:
+    """Per-day, per-waiter aggregates of archived tips. Empty if nothing is archived."""
+    if not ROLLUPS_CSV.exists():
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
     try:
-        df = pd.read_csv(TIPS_CSV)
-        # Coerce dtypes
-        if "amount" in df.columns:
-            df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
-        if "rating" in df.columns:
-            df["rating"] = pd.to_numeric(df["rating"], errors="coerce").fillna(0).astype(int)
-        for col in ["timestamp", "waiter_id", "feedback", "sentiment"]:
+        return _read_rollups(ROLLUPS_CSV.stat().st_mtime_ns)
+    except Exception:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+
+def waiter_totals(df_tips: pd.DataFrame, rollups: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """All-time total_tips, avg_rating and num_tips per waiter.
+
+    Combines the given (hot) tips with archived rollups, so totals survive
+    compaction without reading the archive.
+    """
+    hot = pd.DataFrame(
+        {
+            "waiter_id": df_tips["waiter_id"],
+            "total_tips": df_tips["amount"],
+            "num_tips": 1,
+            "rating_sum": df_tips["rating"],
+        }
+    )
+    parts = [hot]
+    if rollups is not None and not rollups.empty:
+        parts.append(rollups[["waiter_id", "total_tips", "num_tips", "rating_sum"]])
+    both = pd.concat(parts, ignore_index=True) if len(parts) > 1 else hot
+    if both.empty:
+        return pd.DataFrame(columns=["waiter_id", "total_tips", "avg_rating", "num_tips"])
+    agg = both.groupby("waiter_id")[["total_tips", "num_tips", "rating_sum"]].sum().reset_index()
+    agg["num_tips"] = agg["num_tips"].astype(int)
+    agg["avg_rating"] = agg["rating_sum"] / agg["num_tips"].where(agg["num_tips"] > 0)
+    agg["avg_rating"] = agg["avg_rating"].fillna(0.0)
+    return agg[["waiter_id", "total_tips", "avg_rating", "num_tips"]]
+
+
+def load_shifts() -> pd.DataFrame:
+    """Load the shift roster from CSV. Returns empty DataFrame if missing."""
+    if not SHIFTS_CSV.exists():
+        return _empty_shifts_df()
+    try:
+        df = pd.read_csv(SHIFTS_CSV, dtype=str)
+        expected = ["shift_id", "waiter_id", "role", "clock_in", "clock_out"]
+        for col in expected:
             if col not in df.columns:
                 df[col] = ""
-        return df[["timestamp", "waiter_id", "amount", "rating", "feedback", "sentiment"]]
+        return df[expected]
     except Exception:
-        return _empty_tips_df()
+        return _empty_shifts_df()
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Block until holding an exclusive flock on path (no-op without fcntl)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def tips_lock() -> ContextManager[None]:
+    """Exclusive lock on tips.csv across threads and processes (no-op without fcntl)."""
+    return file_lock(TIPS_LOCK)
 
 
 def append_tip(waiter_id: str, amount: float, rating: int, feedback: str, sentiment: str) -> None:
     """Append a tip entry to CSV, creating file with headers if needed."""
-    TIPS_CSV.parent.mkdir(parents=True, exist_ok=True)
+    with tips_lock():
+        _append_tip_row(waiter_id, amount, rating, feedback, sentiment)
+
+
+def _append_tip_row(waiter_id: str, amount: float, rating: int, feedback: str, sentiment: str) -> None:
     exists = TIPS_CSV.exists()
     with TIPS_CSV.open("a", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(
@@ -102,32 +260,38 @@ def append_tip(waiter_id: str, amount: float, rating: int, feedback: str, sentim
         )
 
 
-def waiter_summary(df_tips: pd.DataFrame, waiter_id: str, recent_n: int = 10) -> Dict[str, object]:
-    """Compute summary stats and recent feedback for one waiter."""
-    if df_tips.empty:
-        return {
-            "total_tips": 0.0,
-            "avg_rating": 0.0,
-            "num_tips": 0,
-            "recent_feedback": _empty_tips_df(),
-        }
-    sub = df_tips[df_tips["waiter_id"] == waiter_id].copy()
-    if sub.empty:
+def waiter_summary(
+    df_tips: pd.DataFrame,
+    waiter_id: str,
+    recent_n: int = 10,
+    rollups: Optional[pd.DataFrame] = None,
+) -> Dict[str, object]:
+    """Compute summary stats and recent feedback for one waiter.
+
+    Pass load_rollups() as `rollups` to include archived tips in the totals.
+    """
+    sub = df_tips[df_tips["waiter_id"] == waiter_id].copy() if not df_tips.empty else df_tips
+    total_tips = float(sub["amount"].sum()) if not sub.empty else 0.0
+    rating_sum = float(sub["rating"].sum()) if not sub.empty else 0.0
+    num_tips = int(sub.shape[0])
+    if rollups is not None and not rollups.empty:
+        archived = rollups[rollups["waiter_id"] == waiter_id]
+        total_tips += float(archived["total_tips"].sum())
+        rating_sum += float(archived["rating_sum"].sum())
+        num_tips += int(archived["num_tips"].sum())
+    if num_tips == 0:
         return {
             "total_tips": 0.0,
             "avg_rating": 0.0,
             "num_tips": 0,
             "recent_feedback": _empty_tips_df(),
         }
-    total_tips = round(float(sub["amount"].sum()), 2)
-    avg_rating = float(sub["rating"].mean()) if not sub["rating"].empty else 0.0
-    num_tips = int(sub.shape[0])
-    sub = sub.sort_values("timestamp", ascending=False).head(recent_n)
+    recent = sub.sort_values("timestamp", ascending=False).head(recent_n) if not sub.empty else _empty_tips_df()
     return {
-        "total_tips": total_tips,
-        "avg_rating": avg_rating,
+        "total_tips": round(total_tips, 2),
+        "avg_rating": rating_sum / num_tips,
         "num_tips": num_tips,
-        "recent_feedback": sub[["timestamp", "feedback", "sentiment", "amount", "rating"]],
+        "recent_feedback": recent[["timestamp", "feedback", "sentiment", "amount", "rating"]],
     }
 
 
@@ -135,11 +299,22 @@ __all__ = [
     "DATA_DIR",
     "WAITERS_CSV",
     "TIPS_CSV",
+    "TIPS_LOCK",
+    "SHIFTS_CSV",
     "QRCODES_DIR",
+    "ARCHIVE_DIR",
+    "ROLLUPS_CSV",
+    "archive_partition_path",
+    "archive_partitions",
     "load_waiters",
     "load_tips",
+    "load_shifts",
+    "load_rollups",
     "append_tip",
+    "tips_lock",
+    "file_lock",
     "waiter_summary",
+    "waiter_totals",
 ]
 
 